@@ -2,10 +2,141 @@
 """Read comprehensive data from SIM card using PC/SC"""
 
 import argparse
+import contextlib
+import io
+import struct
 import sys
-from datetime import datetime
-from smartcard.System import readers
-from smartcard.util import toHexString, toBytes
+from dataclasses import dataclass
+
+
+# BCD nibble -> digit string, 0xF is filler and decodes to nothing
+BCD_NIBBLE = tuple(str(n) for n in range(15)) + ("",)
+
+# byte -> byte with its nibbles swapped, so .hex() lists BCD digits low first
+NIBBLE_SWAP = bytes(((b & 0x0F) << 4) | (b >> 4) for b in range(256))
+# hex digit -> BCD_NIBBLE text, dropping the 0xF filler
+BCD_HEX_DIGITS = str.maketrans({'a': '10', 'b': '11', 'c': '12', 'd': '13', 'e': '14', 'f': None})
+# Dialling digits as used in EF_ADN / SMS addresses (TS 31.102 4.4.2.3)
+BCD_HEX_DIALLING = str.maketrans({'a': '*', 'b': '#', 'c': 'p', 'd': 'w', 'e': '+', 'f': None})
+# byte -> (low digit, high digit) for fixed-width MCC/MNC fields, where every
+# nibble is printed
+NIBBLE_PAIR = tuple((str(b & 0x0F), str(b >> 4)) for b in range(256))
+
+# GSM 03.38 default alphabet, indexed by septet value
+GSM7_BASIC = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞ ÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_TABLE = tuple(GSM7_BASIC[i] if i < len(GSM7_BASIC) else '?' for i in range(128))
+
+# Location update status, EF_LOCI byte 11 bits 1-3
+LOCI_STATUS = {0: "Updated", 1: "Not updated", 2: "PLMN not allowed", 3: "Location area not allowed"}
+
+# MS operation mode, EF_AD byte 1
+AD_MS_OPERATION = {
+    0x00: "Normal operation",
+    0x80: "Type approval",
+    0x01: "Normal + specific facilities",
+    0x02: "Normal + type approval",
+    0x04: "Cell test operation"
+}
+
+# EF_Phase value
+SIM_PHASE = {0: "Phase 1", 2: "Phase 2", 3: "Phase 2+"}
+
+# EF_SMS record status byte
+SMS_STATUS = {
+    0x00: "Free",
+    0x01: "Received unread",
+    0x03: "Received read",
+    0x05: "Sent unsent",
+    0x07: "Sent"
+}
+
+# decode_sms() keys printed per message, in order, with their labels
+SMS_FIELDS = (
+    ("sender", "From"),
+    ("recipient", "To"),
+    ("timestamp", "Date"),
+    ("smsc", "SMSC"),
+    ("message", "Text"),
+)
+
+# Transparent EFs under DF_GSM dumped by read_all: (file_id, bytes to read)
+GSM_TRANSPARENT_EFS = (
+    (0x6F07, 9),   # EF_IMSI
+    (0x6F46, 17),  # EF_SPN
+    (0x6F30, 30),  # EF_PLMNsel, first 10 PLMNs
+    (0x6F7B, 12),  # EF_FPLMN, 4 forbidden PLMNs
+    (0x6F7E, 11),  # EF_LOCI
+    (0x6F78, 2),   # EF_ACC
+    (0x6FAD, 4),   # EF_AD
+    (0x6F31, 1),   # EF_HPLMN
+    (0x6FAE, 1),   # EF_Phase
+)
+
+# EF structure from the GSM response (byte 14) and the USIM FCP descriptor byte
+GSM_EF_STRUCTURE = {0x00: "transparent", 0x01: "linear fixed", 0x03: "cyclic"}
+FCP_EF_STRUCTURE = {0x01: "transparent", 0x02: "linear fixed", 0x06: "cyclic"}
+
+# SW1 of a successful SELECT: GSM (90/9F/91), and GSM or USIM (also 61)
+SW1_SELECT_OK = frozenset((0x90, 0x9F, 0x91))
+SW1_SELECT_OK_ANY = SW1_SELECT_OK | {0x61}
+
+# Big-endian 16-bit field reader for file sizes and record lengths
+U16BE = struct.Struct('>H').unpack_from
+
+# Consecutive erased records after which a record scan assumes the rest is unused
+EMPTY_STREAK_STOP = 8
+
+
+def to_hex(data):
+    """Format bytes as space separated upper-case hex, like toHexString"""
+    return bytes(data).hex(' ').upper()
+
+
+def bcd_digits(data, digits=BCD_HEX_DIGITS):
+    """Decode swapped-nibble BCD bytes to a digit string, skipping filler"""
+    return bytes(data).translate(NIBBLE_SWAP).hex().translate(digits)
+
+
+def parse_fcp(data):
+    """Parse a USIM FCP template (TS 102 221 11.1.1.3) into EFInfo"""
+    info = EFInfo()
+    if len(data) < 2:
+        # Truncated response: no template length, nothing to walk
+        return info
+    # Only the file descriptor (82) and file size (80) are needed; every
+    # other TLV is stepped over by its length without being sliced out
+    i = 3 if data[1] == 0x81 else 2
+    while i + 1 < len(data):
+        tag = data[i]
+        length = data[i + 1]
+        start = i + 2
+        if tag == 0x82 and length and start < len(data):  # File descriptor
+            info.structure = FCP_EF_STRUCTURE.get(data[start] & 0x07)
+            if length >= 5 and start + 5 <= len(data):
+                info.record_len, = U16BE(data, start + 2)
+                info.num_records = data[start + 4]
+        elif tag == 0x80 and length >= 2 and start + 2 <= len(data):  # File size
+            info.file_size, = U16BE(data, start)
+        i = start + length
+    return info
+
+
+@contextlib.contextmanager
+def buffered_stdout():
+    """Block-buffer a line-buffered (terminal) stdout, flushing once at the end"""
+    stream = sys.stdout
+    line_buffering = getattr(stream, 'line_buffering', False)
+    if line_buffering:
+        stream.reconfigure(line_buffering=False)
+    try:
+        yield
+    finally:
+        if line_buffering:
+            stream.reconfigure(line_buffering=True)
+        stream.flush()
 
 
 class OutputCapture:
@@ -13,11 +144,11 @@ class OutputCapture:
     def __init__(self, filename=None):
         self.terminal = sys.stdout
         self.filename = filename
-        self.lines = []
+        self.buf = io.StringIO()
 
     def write(self, message):
         self.terminal.write(message)
-        self.lines.append(message)
+        self.buf.write(message)
 
     def flush(self):
         self.terminal.flush()
@@ -25,19 +156,52 @@ class OutputCapture:
     def save(self):
         if self.filename:
             with open(self.filename, 'w') as f:
-                f.writelines(self.lines)
+                f.write(self.buf.getvalue())
             print(f"\nOutput saved to: {self.filename}")
 
+@dataclass
+class EFInfo:
+    """File header fields of an EF, from a GSM SELECT response or USIM FCP"""
+    file_size: int = 0
+    structure: str = None
+    record_len: int = 0
+    num_records: int = 0
+
+
 class SIMReader:
-    def __init__(self, reader_index=0):
+    __slots__ = (
+        'connection', 'reader_index', 'aggressive', 'is_usim', 'usim_aid',
+        '_usim_available', '_gsm_available', 'iccid', 'select_le',
+        '_current_df', '_current_df_response', '_ef_info',
+    )
+
+    def __init__(self, reader_index=0, aggressive=False):
         self.connection = None
         self.reader_index = reader_index
+        # Scan every declared record instead of stopping at caps/empty runs
+        self.aggressive = aggressive
         self.is_usim = False
         self.usim_aid = None
+        # Outcome of the first select_usim() probe: None until probed
+        self._usim_available = None
+        # Whether DF_GSM could be selected: None until first tried
+        self._gsm_available = None
         self.iccid = None
+        # Le appended to class 00 SELECTs; only T=1 returns the FCP directly
+        self.select_le = []
+        # Last selected MF/DF file ID (or ADF AID tuple) and its SELECT response
+        self._current_df = None
+        self._current_df_response = None
+        # (current DF, file_id) -> EFInfo, parsed once from the first SELECT
+        # response; the same FID exists under DF_GSM, DF_TELECOM and ADF_USIM
+        self._ef_info = {}
 
     def connect(self):
         """Connect to SIM card"""
+        # pyscard is only needed once a card is actually used
+        from smartcard.CardConnection import CardConnection
+        from smartcard.System import readers
+
         r = readers()
         print(f"Available readers: {len(r)}")
         for i, reader in enumerate(r):
@@ -51,31 +215,102 @@ class SIMReader:
 
         self.connection = reader.createConnection()
         self.connection.connect()
-        print(f"ATR: {toHexString(self.connection.getATR())}")
+        self._current_df = None
+        self._usim_available = None
+        self._gsm_available = None
+        self._ef_info = {}
+        if self.connection.getProtocol() == CardConnection.T1_protocol:
+            self.select_le = [0x00]
+        print(f"ATR: {to_hex(self.connection.getATR())}")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Hold the card exclusively (SCardBeginTransaction) while in the block"""
+        # PCSCCardConnection sits behind the connection decorator
+        hcard = getattr(getattr(self.connection, 'component', None), 'hcard', None)
+        if hcard is None:
+            yield
+            return
+
+        from smartcard.scard import (SCARD_LEAVE_CARD, SCARD_S_SUCCESS,
+                                     SCardBeginTransaction, SCardEndTransaction)
+        locked = SCardBeginTransaction(hcard) == SCARD_S_SUCCESS
+        try:
+            yield
+        finally:
+            if locked:
+                SCardEndTransaction(hcard, SCARD_LEAVE_CARD)
 
     def send_apdu(self, apdu):
         """Send APDU command and return response"""
         data, sw1, sw2 = self.connection.transmit(apdu)
-        return data, sw1, sw2
+        # pyscard hands back a list of ints; bytes slice and compare in C
+        return bytes(data), sw1, sw2
 
     def select_file_gsm(self, file_id, debug=False):
         """Select file using GSM commands (Class A0)"""
+        # MF (3F..), DF (7F..) and sub-DF (5F..) stay current until another
+        # DF is selected, so reselecting the same one is a wasted round trip
+        is_df = (file_id >> 8) in (0x3F, 0x5F, 0x7F)
+        if is_df and file_id == self._current_df:
+            return self._current_df_response
+
         apdu = [0xA0, 0xA4, 0x00, 0x00, 0x02, (file_id >> 8) & 0xFF, file_id & 0xFF]
         data, sw1, sw2 = self.send_apdu(apdu)
 
         if debug:
             print(f"    SELECT {file_id:04X}: SW={sw1:02X}{sw2:02X}")
 
-        if sw1 == 0x9F:
+        # The header of an EF we have seen before is already in _ef_info
+        if sw1 == 0x9F and (is_df or self.ef_key(file_id) not in self._ef_info):
             # Get response
             apdu = [0xA0, 0xC0, 0x00, 0x00, sw2]
             data, sw1, sw2 = self.send_apdu(apdu)
             if debug:
                 print(f"    GET RESPONSE: SW={sw1:02X}{sw2:02X} len={len(data)}")
-            return data, sw1, sw2
+
+            if not is_df and sw1 in [0x90, 0x91]:
+                self.store_ef_info(file_id, data)
+
+        if is_df and sw1 in [0x90, 0x91]:
+            self._current_df = file_id
+            self._current_df_response = (data, sw1, sw2)
 
         return data, sw1, sw2
 
+    def select_df_gsm(self):
+        """Make DF_GSM (7F20) the current directory if it is not already
+
+        Returns False without touching the card once DF_GSM has been found
+        missing, so USIM-only cards stop paying for GSM selects.
+        """
+        if self._gsm_available is False:
+            return False
+        if self._current_df != 0x7F20:
+            self.select_file_gsm(0x3F00)
+            data, sw1, sw2 = self.select_file_gsm(0x7F20)
+            self._gsm_available = sw1 in [0x90, 0x91]
+        return self._gsm_available
+
+    def select_record_ef(self, file_id, verbose=False):
+        """Select a record EF in DF_GSM, falling back to the USIM ADF
+
+        Returns (sw1, use_usim) for the select that was used; verbose
+        reports the fallback.
+        """
+        sw1 = None
+        if self.select_df_gsm():
+            data, sw1, sw2 = self.select_file_gsm(file_id)
+            if sw1 in SW1_SELECT_OK:
+                return sw1, False
+
+        if verbose:
+            print("  (Trying USIM ADF...)")
+        if self.select_usim():
+            data, sw1, sw2 = self.select_file_usim(file_id)
+            return sw1, True
+        return sw1, False
+
     def read_binary(self, length, offset=0):
         """Read binary data from selected file"""
         apdu = [0xA0, 0xB0, (offset >> 8) & 0xFF, offset & 0xFF, length]
@@ -87,19 +322,79 @@ class SIMReader:
 
         return data, sw1, sw2
 
+    def read_transparent_efs(self, efs):
+        """Select and read (file_id, length) EFs in the current DF back to back
+
+        Returns a dict of file_id -> (data, sw1, sw2) from READ BINARY, or
+        None for files that could not be selected.
+        """
+        results = {}
+        for file_id, length in efs:
+            data, sw1, sw2 = self.select_file_gsm(file_id)
+            if sw1 in SW1_SELECT_OK:
+                results[file_id] = self.read_binary(length)
+            else:
+                results[file_id] = None
+        return results
+
     def read_record(self, record_num, length):
         """Read record from selected file"""
         apdu = [0xA0, 0xB2, record_num, 0x04, length]
         data, sw1, sw2 = self.send_apdu(apdu)
         return data, sw1, sw2
 
+    def read_records(self, num_records, record_len, use_usim=False,
+                     cap=None, empty_record=None):
+        """Read records 1..num_records of the selected EF in one loop
+
+        Yields (record_num, data) for each record read successfully and
+        stops early once the card reports the end of the file. Unless
+        aggressive, at most cap records are read and the scan stops after
+        EMPTY_STREAK_STOP consecutive records equal to empty_record.
+        """
+        read_record = self.read_record_usim if use_usim else self.read_record
+        if cap is not None and not self.aggressive:
+            num_records = min(num_records, cap)
+        if self.aggressive:
+            empty_record = None
+        empty_streak = 0
+        for rec in range(1, num_records + 1):
+            data, sw1, sw2 = read_record(rec, record_len)
+            if sw1 == 0x90 and data:
+                if empty_record is not None:
+                    if data == empty_record:
+                        empty_streak += 1
+                        # A run that ends on the last record skips nothing
+                        if empty_streak >= EMPTY_STREAK_STOP and rec < num_records:
+                            print(f"  (Stopped after {empty_streak} empty records at record "
+                                  f"{rec} of {num_records}, use --aggressive to scan all)")
+                            break
+                    else:
+                        empty_streak = 0
+                yield rec, data
+            elif sw1 == 0x6A and sw2 == 0x83:
+                # Record not found - end of file
+                break
+
     def select_usim(self):
         """Try to select USIM ADF"""
+        if self._usim_available is not None:
+            # Already probed: only reselect the ADF if we have left it
+            if not self._usim_available:
+                return False
+            data, sw1, sw2 = self.select_adf(self.usim_aid)
+            return sw1 == 0x90
+
+        self._usim_available = self.probe_usim()
+        return self._usim_available
+
+    def probe_usim(self):
+        """Find the USIM AID via EF_DIR and select the ADF"""
         # First, read EF_DIR to find USIM AID
         self.select_file_gsm(0x3F00)
 
         # Select EF_DIR (2F00)
-        apdu = [0x00, 0xA4, 0x00, 0x04, 0x02, 0x2F, 0x00]
+        apdu = [0x00, 0xA4, 0x00, 0x04, 0x02, 0x2F, 0x00] + self.select_le
         data, sw1, sw2 = self.send_apdu(apdu)
 
         if sw1 == 0x61:
@@ -109,12 +404,7 @@ class SIMReader:
         if sw1 != 0x90:
             # Try common USIM AID directly
             usim_aid = [0xA0, 0x00, 0x00, 0x00, 0x87, 0x10, 0x02, 0xFF, 0xFF, 0xFF, 0xFF, 0x89, 0x06, 0x01, 0x00, 0x00]
-            apdu = [0x00, 0xA4, 0x04, 0x04, len(usim_aid)] + usim_aid
-            data, sw1, sw2 = self.send_apdu(apdu)
-
-            if sw1 == 0x61:
-                apdu = [0x00, 0xC0, 0x00, 0x00, sw2]
-                data, sw1, sw2 = self.send_apdu(apdu)
+            data, sw1, sw2 = self.select_adf(usim_aid)
 
             if sw1 == 0x90:
                 self.is_usim = True
@@ -128,32 +418,39 @@ class SIMReader:
 
         if sw1 == 0x90 and data:
             # Parse TLV to find AID
-            # Look for tag 4F (AID)
-            i = 0
-            while i < len(data) - 2:
-                if data[i] == 0x61:  # Application template
-                    i += 1
-                    template_len = data[i]
-                    i += 1
-                    end = i + template_len
-                    while i < end and i < len(data) - 2:
-                        tag = data[i]
-                        i += 1
-                        length = data[i]
-                        i += 1
-                        if tag == 0x4F:  # AID tag
-                            aid = list(data[i:i+length])
-                            self.usim_aid = aid
-                            break
-                        i += length
-                    break
-                i += 1
+            # Look for tag 4F (AID) inside the application template (61)
+            start = data.find(b'\x61', 0, len(data) - 2)
+            if start >= 0:
+                template = data[start + 2:start + 2 + data[start + 1]]
+                i = 0
+                while i + 1 < len(template):
+                    tag = template[i]
+                    length = template[i + 1]
+                    if tag == 0x4F:  # AID tag
+                        self.usim_aid = list(template[i + 2:i + 2 + length])
+                        break
+                    i += 2 + length
 
         # Select USIM ADF using discovered or default AID
         if not self.usim_aid:
             self.usim_aid = [0xA0, 0x00, 0x00, 0x00, 0x87, 0x10, 0x02, 0xFF, 0xFF, 0xFF, 0xFF, 0x89, 0x06, 0x01, 0x00, 0x00]
 
-        apdu = [0x00, 0xA4, 0x04, 0x04, len(self.usim_aid)] + self.usim_aid
+        data, sw1, sw2 = self.select_adf(self.usim_aid)
+
+        if sw1 == 0x90:
+            self.is_usim = True
+            return True
+
+        return False
+
+    def select_adf(self, aid):
+        """Select an application DF by AID and track it as the current DF"""
+        # The AID tuple stands in for a file ID in the current-DF cache
+        aid_key = tuple(aid)
+        if aid_key == self._current_df:
+            return self._current_df_response
+
+        apdu = [0x00, 0xA4, 0x04, 0x04, len(aid)] + list(aid) + self.select_le
         data, sw1, sw2 = self.send_apdu(apdu)
 
         if sw1 == 0x61:
@@ -161,27 +458,77 @@ class SIMReader:
             data, sw1, sw2 = self.send_apdu(apdu)
 
         if sw1 == 0x90:
-            self.is_usim = True
-            return True
+            self._current_df = aid_key
+            self._current_df_response = (data, sw1, sw2)
+        else:
+            self._current_df = None
 
-        return False
+        return data, sw1, sw2
 
     def select_file_usim(self, file_id, debug=False):
         """Select file using USIM commands (Class 00)"""
-        apdu = [0x00, 0xA4, 0x00, 0x04, 0x02, (file_id >> 8) & 0xFF, file_id & 0xFF]
+        is_df = (file_id >> 8) in (0x3F, 0x5F, 0x7F)
+        if is_df and file_id == self._current_df:
+            return self._current_df_response
+
+        apdu = [0x00, 0xA4, 0x00, 0x04, 0x02, (file_id >> 8) & 0xFF, file_id & 0xFF] + self.select_le
         data, sw1, sw2 = self.send_apdu(apdu)
 
         if debug:
             print(f"    SELECT {file_id:04X}: SW={sw1:02X}{sw2:02X}")
 
-        if sw1 == 0x61:
+        if sw1 == 0x61 and (is_df or self.ef_key(file_id) not in self._ef_info):
             apdu = [0x00, 0xC0, 0x00, 0x00, sw2]
             data, sw1, sw2 = self.send_apdu(apdu)
             if debug:
                 print(f"    GET RESPONSE: SW={sw1:02X}{sw2:02X} len={len(data)}")
 
+        if is_df and sw1 == 0x90:
+            self._current_df = file_id
+            self._current_df_response = (data, sw1, sw2)
+        elif sw1 == 0x90 and data:
+            self.store_ef_info(file_id, data)
+
         return data, sw1, sw2
 
+    def ef_key(self, file_id):
+        """Return the _ef_info key of file_id in the current DF, None if unknown"""
+        if self._current_df is None:
+            return None
+        return self._current_df, file_id
+
+    def store_ef_info(self, file_id, data):
+        """Parse a SELECT response into EFInfo and remember it for file_id"""
+        key = self.ef_key(file_id)
+        info = self.parse_file_header(data)
+        if key and info:
+            self._ef_info[key] = info
+
+    def parse_file_header(self, data):
+        """Parse a GSM SELECT response or USIM FCP template into EFInfo"""
+        if data and data[0] == 0x62:
+            return parse_fcp(data)
+
+        if len(data) > 14:
+            # GSM response to SELECT on an EF (TS 51.011 9.2.1)
+            info = EFInfo(
+                file_size=U16BE(data, 2)[0],
+                structure=GSM_EF_STRUCTURE.get(data[13]),
+                record_len=data[14]
+            )
+            if info.record_len:
+                info.num_records = info.file_size // info.record_len
+            return info
+
+        return None
+
+    def record_layout(self, file_id, default_len, default_records):
+        """Return (record_len, num_records) of a selected EF, or the defaults"""
+        info = self._ef_info.get(self.ef_key(file_id))
+        record_len = info.record_len if info and info.record_len else default_len
+        num_records = info.num_records if info and info.num_records else default_records
+        return record_len, num_records
+
     def read_binary_usim(self, length, offset=0):
         """Read binary data using USIM commands"""
         apdu = [0x00, 0xB0, (offset >> 8) & 0xFF, offset & 0xFF, length]
@@ -199,34 +546,15 @@ class SIMReader:
         if len(data) < 9:
             return None
         length = data[0]
-        imsi = ""
-        for i in range(1, length + 1):
-            if i < len(data):
-                byte = data[i]
-                if i == 1:
-                    high = (byte >> 4) & 0x0F
-                    if high != 0x0F:
-                        imsi += str(high)
-                else:
-                    low = byte & 0x0F
-                    high = (byte >> 4) & 0x0F
-                    if low != 0x0F:
-                        imsi += str(low)
-                    if high != 0x0F:
-                        imsi += str(high)
-        return imsi
+        digits = data[1:length + 1]
+        if not digits:
+            return ""
+        # First byte carries the parity nibble in its low half
+        return BCD_NIBBLE[digits[0] >> 4] + bcd_digits(digits[1:])
 
     def decode_iccid(self, data):
         """Decode ICCID from EF_ICCID"""
-        iccid = ""
-        for byte in data:
-            low = byte & 0x0F
-            high = (byte >> 4) & 0x0F
-            if low != 0x0F:
-                iccid += str(low)
-            if high != 0x0F:
-                iccid += str(high)
-        return iccid
+        return bcd_digits(data)
 
     def decode_spn(self, data):
         """Decode Service Provider Name"""
@@ -234,15 +562,11 @@ class SIMReader:
             return None
         # First byte is display condition, rest is name
         display_condition = data[0]
-        name_bytes = data[1:]
         # Remove padding (0xFF)
-        name_bytes = [b for b in name_bytes if b != 0xFF]
-        try:
-            # Try GSM 7-bit first, fallback to ASCII
-            name = bytes(name_bytes).decode('utf-8', errors='replace')
-        except:
-            name = bytes(name_bytes).decode('latin-1', errors='replace')
-        return name.strip()
+        name_bytes = bytes(data[1:]).replace(b'\xff', b'')
+        if not name_bytes:
+            return ""
+        return name_bytes.decode('utf-8', errors='replace').strip()
 
     def decode_msisdn(self, data):
         """Decode phone number from EF_MSISDN"""
@@ -251,37 +575,27 @@ class SIMReader:
 
         # Alpha identifier length varies, phone number is in last 14 bytes
         # Structure: Alpha ID (variable) + BCD number length (1) + TON/NPI (1) + Number (10) + CCI (1) + EXT (1)
-        alpha_len = len(data) - 14
-        alpha = data[:alpha_len]
+        record = memoryview(bytes(data))
+        alpha_len = len(record) - 14
+        alpha = record[:alpha_len]
 
-        bcd_len = data[alpha_len]
+        bcd_len = record[alpha_len]
         if bcd_len == 0xFF or bcd_len == 0:
             return None
 
-        ton_npi = data[alpha_len + 1]
-        number_bytes = data[alpha_len + 2:alpha_len + 12]
+        ton_npi = record[alpha_len + 1]
+        number_bytes = record[alpha_len + 2:alpha_len + 12]
 
         # Decode BCD number
-        number = ""
+        number = bcd_digits(number_bytes)
         if ton_npi == 0x91:  # International
-            number = "+"
-
-        for byte in number_bytes:
-            low = byte & 0x0F
-            high = (byte >> 4) & 0x0F
-            if low != 0x0F:
-                number += str(low)
-            if high != 0x0F:
-                number += str(high)
+            number = "+" + number
 
         # Decode alpha tag
         alpha_tag = ""
-        alpha_clean = [b for b in alpha if b != 0xFF]
+        alpha_clean = bytes(alpha).replace(b'\xff', b'')
         if alpha_clean:
-            try:
-                alpha_tag = bytes(alpha_clean).decode('utf-8', errors='replace').strip()
-            except:
-                pass
+            alpha_tag = alpha_clean.decode('utf-8', errors='replace').strip()
 
         return {"number": number, "alpha": alpha_tag} if number else None
 
@@ -311,41 +625,34 @@ class SIMReader:
         number_start = smsc_len_offset + 2
         number_bytes = data[number_start:number_start + smsc_len - 1]
 
-        smsc = ""
+        smsc = bcd_digits(number_bytes)
         if ton_npi == 0x91:
-            smsc = "+"
-
-        for byte in number_bytes:
-            low = byte & 0x0F
-            high = (byte >> 4) & 0x0F
-            if low != 0x0F:
-                smsc += str(low)
-            if high != 0x0F:
-                smsc += str(high)
+            smsc = "+" + smsc
 
         return smsc if smsc else None
 
     def decode_plmn(self, data):
         """Decode PLMN list (MCC + MNC pairs)"""
+        # Unused entries are FF FF FF, often the whole file
+        if bytes(data).count(0xFF) == len(data):
+            return []
+
         plmns = []
-        for i in range(0, len(data), 3):
-            if i + 2 >= len(data):
-                break
-            b1, b2, b3 = data[i], data[i+1], data[i+2]
+        for b1, b2, b3 in zip(data[0::3], data[1::3], data[2::3]):
             if b1 == 0xFF and b2 == 0xFF and b3 == 0xFF:
                 continue
 
+            mcc_d1, mcc_d2 = NIBBLE_PAIR[b1]
+            mcc_d3, mnc_d3 = NIBBLE_PAIR[b2]
+            mnc_d1, mnc_d2 = NIBBLE_PAIR[b3]
+
             # MCC is in b1 and low nibble of b2
-            mcc = f"{b1 & 0x0F}{(b1 >> 4) & 0x0F}{b2 & 0x0F}"
+            mcc = mcc_d1 + mcc_d2 + mcc_d3
             # MNC is in b3 and high nibble of b2
-            mnc_d1 = b3 & 0x0F
-            mnc_d2 = (b3 >> 4) & 0x0F
-            mnc_d3 = (b2 >> 4) & 0x0F
-
-            if mnc_d3 == 0x0F:
-                mnc = f"{mnc_d1}{mnc_d2}"
+            if b2 >= 0xF0:
+                mnc = mnc_d1 + mnc_d2
             else:
-                mnc = f"{mnc_d1}{mnc_d2}{mnc_d3}"
+                mnc = mnc_d1 + mnc_d2 + mnc_d3
 
             if mcc != "FFF":
                 plmns.append(f"{mcc}-{mnc}")
@@ -358,38 +665,33 @@ class SIMReader:
             return None
 
         # TMSI (4 bytes) + LAI (5 bytes) + TMSI TIME (1 byte) + Location update status (1 byte)
-        tmsi = toHexString(data[0:4]).replace(" ", "")
-        lai = data[4:9]
-
         # LAI = MCC (3 digits) + MNC (2-3 digits) + LAC (2 bytes)
-        mcc = f"{lai[0] & 0x0F}{(lai[0] >> 4) & 0x0F}{lai[1] & 0x0F}"
-        mnc_d3 = (lai[1] >> 4) & 0x0F
-        mnc_d1 = lai[2] & 0x0F
-        mnc_d2 = (lai[2] >> 4) & 0x0F
+        tmsi, plmn, lac, tmsi_time, update_status = struct.unpack_from('>4s3sHBB', bytes(data))
+        tmsi = tmsi.hex().upper()
 
-        if mnc_d3 == 0x0F:
-            mnc = f"{mnc_d1}{mnc_d2}"
-        else:
-            mnc = f"{mnc_d1}{mnc_d2}{mnc_d3}"
-
-        lac = (lai[3] << 8) | lai[4]
-        update_status = data[10] if len(data) > 10 else 0
+        mcc_d1, mcc_d2 = NIBBLE_PAIR[plmn[0]]
+        mcc_d3, mnc_d3 = NIBBLE_PAIR[plmn[1]]
+        mnc_d1, mnc_d2 = NIBBLE_PAIR[plmn[2]]
+        mcc = mcc_d1 + mcc_d2 + mcc_d3
 
-        status_map = {0: "Updated", 1: "Not updated", 2: "PLMN not allowed", 3: "Location area not allowed"}
+        if plmn[1] >= 0xF0:
+            mnc = mnc_d1 + mnc_d2
+        else:
+            mnc = mnc_d1 + mnc_d2 + mnc_d3
 
         return {
             "tmsi": tmsi,
             "mcc": mcc,
             "mnc": mnc,
             "lac": f"0x{lac:04X} ({lac})",
-            "update_status": status_map.get(update_status & 0x07, f"Unknown ({update_status})")
+            "update_status": LOCI_STATUS.get(update_status & 0x07, f"Unknown ({update_status})")
         }
 
     def decode_acc(self, data):
         """Decode Access Control Class"""
         if len(data) < 2:
             return None
-        acc = (data[0] << 8) | data[1]
+        acc, = U16BE(bytes(data))
         classes = []
         for i in range(16):
             if acc & (1 << i):
@@ -414,18 +716,10 @@ class SIMReader:
         if len(data) < 3:
             return None
 
-        ms_operation = data[0]
-        op_map = {
-            0x00: "Normal operation",
-            0x80: "Type approval",
-            0x01: "Normal + specific facilities",
-            0x02: "Normal + type approval",
-            0x04: "Cell test operation"
-        }
-
+        ms_operation, _, ofm_flags = struct.unpack_from('>BBB', bytes(data))
         result = {
-            "ms_operation": op_map.get(ms_operation, f"Unknown (0x{ms_operation:02X})"),
-            "ofm": "OFM supported" if (data[2] & 0x01) else "OFM not supported"
+            "ms_operation": AD_MS_OPERATION.get(ms_operation, f"Unknown (0x{ms_operation:02X})"),
+            "ofm": "OFM supported" if (ofm_flags & 0x01) else "OFM not supported"
         }
 
         if len(data) >= 4:
@@ -437,11 +731,7 @@ class SIMReader:
     def decode_alpha_id(self, data):
         """Decode alpha identifier (contact name)"""
         # Remove trailing 0xFF padding
-        clean = []
-        for b in data:
-            if b == 0xFF:
-                break
-            clean.append(b)
+        clean = bytes(data).partition(b'\xff')[0]
 
         if not clean:
             return None
@@ -449,10 +739,7 @@ class SIMReader:
         # Check for UCS2 encoding
         if clean[0] == 0x80:
             # UCS2 encoding
-            try:
-                return bytes(clean[1:]).decode('utf-16-be', errors='replace').strip()
-            except:
-                pass
+            return clean[1:].decode('utf-16-be', errors='replace').strip()
         elif clean[0] == 0x81 and len(clean) > 3:
             # UCS2 with base pointer
             try:
@@ -469,10 +756,7 @@ class SIMReader:
                 pass
 
         # GSM 7-bit default alphabet or ASCII
-        try:
-            return bytes(clean).decode('utf-8', errors='replace').strip()
-        except:
-            return bytes(clean).decode('latin-1', errors='replace').strip()
+        return clean.decode('utf-8', errors='replace').strip()
 
     def decode_bcd_number(self, data, include_ton=True):
         """Decode BCD encoded phone number"""
@@ -483,24 +767,9 @@ class SIMReader:
         if bcd_len == 0xFF or bcd_len == 0:
             return None
 
-        ton_npi = data[1]
-        number_bytes = data[2:2 + bcd_len - 1]
-
-        number = ""
-        if include_ton and ton_npi == 0x91:  # International
-            number = "+"
-
-        for byte in number_bytes:
-            low = byte & 0x0F
-            high = (byte >> 4) & 0x0F
-
-            # Handle special digits
-            digit_map = {0x0A: '*', 0x0B: '#', 0x0C: 'p', 0x0D: 'w', 0x0E: '+'}
-
-            if low != 0x0F:
-                number += digit_map.get(low, str(low))
-            if high != 0x0F:
-                number += digit_map.get(high, str(high))
+        number = bcd_digits(data[2:2 + bcd_len - 1], BCD_HEX_DIALLING)
+        if include_ton and data[1] == 0x91:  # International
+            number = "+" + number
 
         return number if number else None
 
@@ -509,15 +778,9 @@ class SIMReader:
         if not data or len(data) < 1:
             return None
 
+        # Work on bytes so slices and address splices stay in C
+        data = bytes(data)
         status = data[0]
-        status_map = {
-            0x00: "Free",
-            0x01: "Received unread",
-            0x03: "Received read",
-            0x05: "Sent unsent",
-            0x07: "Sent"
-        }
-
         if status == 0x00 or status == 0xFF:
             return None  # Empty slot
 
@@ -527,27 +790,27 @@ class SIMReader:
 
         if smsc_len > 0 and smsc_len != 0xFF:
             smsc_data = data[1:2 + smsc_len]
-            smsc = self.decode_bcd_number([smsc_len] + list(data[2:2+smsc_len]))
+            smsc = self.decode_bcd_number(bytes((smsc_len,)) + data[2:2+smsc_len])
             pdu_start = 2 + smsc_len
         else:
             smsc = None
             pdu_start = 2
 
         if pdu_start >= len(data):
-            return {"status": status_map.get(status, f"Unknown ({status})")}
+            return {"status": SMS_STATUS.get(status, f"Unknown ({status})")}
 
         # PDU parsing
         pdu = data[pdu_start:]
 
         if len(pdu) < 2:
-            return {"status": status_map.get(status, f"Unknown ({status})")}
+            return {"status": SMS_STATUS.get(status, f"Unknown ({status})")}
 
         # First octet
         first_octet = pdu[0]
         mti = first_octet & 0x03  # Message type indicator
 
         result = {
-            "status": status_map.get(status, f"Unknown ({status})"),
+            "status": SMS_STATUS.get(status, f"Unknown ({status})"),
             "smsc": smsc
         }
 
@@ -560,7 +823,7 @@ class SIMReader:
             sender_type = pdu[2] if len(pdu) > 2 else 0x81
 
             sender_bytes_len = (sender_len + 1) // 2
-            sender_data = [sender_bytes_len + 1, sender_type] + list(pdu[3:3 + sender_bytes_len])
+            sender_data = bytes((sender_bytes_len + 1, sender_type)) + pdu[3:3 + sender_bytes_len]
             sender = self.decode_bcd_number(sender_data)
             result["sender"] = sender
 
@@ -589,14 +852,11 @@ class SIMReader:
 
                     # Decode based on DCS
                     if (dcs & 0x0C) == 0x08:  # UCS2
-                        try:
-                            result["message"] = bytes(ud[:udl]).decode('utf-16-be', errors='replace')
-                        except:
-                            result["message"] = f"[UCS2: {toHexString(ud[:udl])}]"
+                        result["message"] = bytes(ud[:udl]).decode('utf-16-be', errors='replace')
                     elif (dcs & 0x0C) == 0x00:  # GSM 7-bit
                         result["message"] = self.decode_gsm7(ud, udl)
                     else:
-                        result["message"] = f"[Data: {toHexString(ud[:udl])}]"
+                        result["message"] = f"[Data: {to_hex(ud[:udl])}]"
 
         elif mti == 0x01:  # SMS-SUBMIT (sent)
             # Message reference
@@ -608,7 +868,7 @@ class SIMReader:
             dest_type = pdu[3] if len(pdu) > 3 else 0x81
 
             dest_bytes_len = (dest_len + 1) // 2
-            dest_data = [dest_bytes_len + 1, dest_type] + list(pdu[4:4 + dest_bytes_len])
+            dest_data = bytes((dest_bytes_len + 1, dest_type)) + pdu[4:4 + dest_bytes_len]
             dest = self.decode_bcd_number(dest_data)
             result["recipient"] = dest
 
@@ -631,50 +891,56 @@ class SIMReader:
                     ud = pdu[ud_offset + 1:]
 
                     if (dcs & 0x0C) == 0x08:  # UCS2
-                        try:
-                            result["message"] = bytes(ud[:udl]).decode('utf-16-be', errors='replace')
-                        except:
-                            result["message"] = f"[UCS2: {toHexString(ud[:udl])}]"
+                        result["message"] = bytes(ud[:udl]).decode('utf-16-be', errors='replace')
                     elif (dcs & 0x0C) == 0x00:  # GSM 7-bit
                         result["message"] = self.decode_gsm7(ud, udl)
                     else:
-                        result["message"] = f"[Data: {toHexString(ud[:udl])}]"
+                        result["message"] = f"[Data: {to_hex(ud[:udl])}]"
 
         return result
 
     def decode_gsm7(self, data, num_chars):
         """Decode GSM 7-bit packed data"""
-        gsm7_basic = (
-            "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞ ÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
-            "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
-        )
-
-        result = ""
-        bits = 0
-        byte_pos = 0
-        bit_pos = 0
-
-        for i in range(num_chars):
-            # Extract 7 bits
-            if byte_pos >= len(data):
-                break
+        # Septets are packed LSB-first, so the whole stream reads as one
+        # little-endian integer and each character is a 7-bit field of it
+        data = data[:(num_chars * 7 + 7) // 8]
+        packed = int.from_bytes(bytes(data), 'little')
+        count = min(num_chars, (len(data) * 8 + 6) // 7)
+        return "".join(GSM7_TABLE[(packed >> (7 * i)) & 0x7F] for i in range(count))
+
+    def dump_phonebook(self, file_id, default_records, cap, number_required=False,
+                       no_name="No name", verbose=False):
+        """Print the entries of an ADN-format EF, GSM first then USIM
+
+        Returns the number of entries printed, or None if the EF could not
+        be selected. Entries without a number are skipped when
+        number_required is set; verbose also reports the USIM fallback and
+        the record layout.
+        """
+        sw1, use_usim = self.select_record_ef(file_id, verbose)
+        if sw1 not in SW1_SELECT_OK_ANY:
+            return None
 
-            char_val = (data[byte_pos] >> bit_pos) & 0x7F
+        # Record layout from the FCP template (USIM) or GSM response
+        record_len, num_records = self.record_layout(file_id, 34, default_records)
+        if verbose:
+            print(f"  Record length: {record_len}, Max records: {num_records}")
 
-            if bit_pos > 1 and byte_pos + 1 < len(data):
-                char_val |= (data[byte_pos + 1] << (8 - bit_pos)) & 0x7F
+        found = 0
+        alpha_len = record_len - 14
+        empty_record = b'\xff' * record_len
+        for rec, data in self.read_records(num_records, record_len, use_usim,
+                                           cap=cap, empty_record=empty_record):
+            if data == empty_record:
+                continue
 
-            bit_pos += 7
-            if bit_pos >= 8:
-                bit_pos -= 8
-                byte_pos += 1
+            alpha = self.decode_alpha_id(data[:alpha_len])
+            number = self.decode_bcd_number(data[alpha_len:])
 
-            if char_val < len(gsm7_basic):
-                result += gsm7_basic[char_val]
-            else:
-                result += '?'
-
-        return result
+            if number or (alpha and not number_required):
+                found += 1
+                print(f"  [{rec}] {alpha or no_name}: {number or 'No number'}")
+        return found
 
     def read_all(self):
         """Read all accessible SIM data"""
@@ -687,24 +953,26 @@ class SIMReader:
 
         # ===== ICCID (EF_ICCID - 2FE2) =====
         print("\n--- ICCID (SIM Serial Number) ---")
-        self.select_file_gsm(0x3F00)
         data, sw1, sw2 = self.select_file_gsm(0x2FE2)
-        if sw1 in [0x90, 0x9F, 0x91]:
+        if sw1 in SW1_SELECT_OK:
             data, sw1, sw2 = self.read_binary(10)
             if sw1 == 0x90:
                 self.iccid = self.decode_iccid(data)
                 print(f"ICCID: {self.iccid}")
-                print(f"Raw: {toHexString(data)}")
+                print(f"Raw: {to_hex(data)}")
 
-        # Select DF GSM (7F20)
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
+        # Select DF GSM (7F20) and read its transparent EFs back to back;
+        # without DF_GSM every section below reports "Not available"
+        if self.select_df_gsm():
+            gsm_efs = self.read_transparent_efs(GSM_TRANSPARENT_EFS)
+        else:
+            gsm_efs = dict.fromkeys(file_id for file_id, _ in GSM_TRANSPARENT_EFS)
 
         # ===== IMSI (EF_IMSI - 6F07) =====
         print("\n--- IMSI ---")
-        data, sw1, sw2 = self.select_file_gsm(0x6F07)
-        if sw1 in [0x90, 0x9F, 0x91]:
-            data, sw1, sw2 = self.read_binary(9)
+        result = gsm_efs[0x6F07]
+        if result:
+            data, sw1, sw2 = result
             if sw1 == 0x90:
                 imsi = self.decode_imsi(data)
                 print(f"IMSI: {imsi}")
@@ -712,30 +980,25 @@ class SIMReader:
                     print(f"  MCC: {imsi[:3]}")
                     print(f"  MNC: {imsi[3:5] if len(imsi) > 4 else 'N/A'}")
                     print(f"  MSIN: {imsi[5:] if len(imsi) > 5 else 'N/A'}")
-                print(f"Raw: {toHexString(data)}")
+                print(f"Raw: {to_hex(data)}")
 
         # ===== SPN (EF_SPN - 6F46) =====
         print("\n--- Service Provider Name ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F46)
-        if sw1 in [0x90, 0x9F, 0x91]:
-            data, sw1, sw2 = self.read_binary(17)
+        result = gsm_efs[0x6F46]
+        if result:
+            data, sw1, sw2 = result
             if sw1 == 0x90:
                 spn = self.decode_spn(data)
                 print(f"SPN: {spn}")
-                print(f"Raw: {toHexString(data)}")
+                print(f"Raw: {to_hex(data)}")
         else:
             print("Not available")
 
         # ===== MSISDN - Phone Number (EF_MSISDN - 6F40) =====
         print("\n--- Phone Number (MSISDN) ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F40)
-        if sw1 in [0x90, 0x9F, 0x91]:
+        if self.select_df_gsm() and self.select_file_gsm(0x6F40)[1] in SW1_SELECT_OK:
             # Get file info to determine record length
-            record_len = data[14] if len(data) > 14 else 34
+            record_len, _ = self.record_layout(0x6F40, 34, 1)
             data, sw1, sw2 = self.read_record(1, record_len)
             if sw1 == 0x90:
                 msisdn = self.decode_msisdn(data)
@@ -745,32 +1008,27 @@ class SIMReader:
                         print(f"Alpha Tag: {msisdn['alpha']}")
                 else:
                     print("No number stored")
-                print(f"Raw: {toHexString(data)}")
+                print(f"Raw: {to_hex(data)}")
         else:
             print("Not available")
 
         # ===== SMSP - SMS Parameters (EF_SMSP - 6F42) =====
         print("\n--- SMS Service Center ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F42)
-        if sw1 in [0x90, 0x9F, 0x91]:
-            record_len = data[14] if len(data) > 14 else 40
+        if self.select_df_gsm() and self.select_file_gsm(0x6F42)[1] in SW1_SELECT_OK:
+            record_len, _ = self.record_layout(0x6F42, 40, 1)
             data, sw1, sw2 = self.read_record(1, record_len)
             if sw1 == 0x90:
                 smsc = self.decode_smsp(data)
                 print(f"SMSC: {smsc if smsc else 'Not set'}")
-                print(f"Raw: {toHexString(data)}")
+                print(f"Raw: {to_hex(data)}")
         else:
             print("Not available")
 
         # ===== PLMNsel - PLMN Selector (EF_PLMNsel - 6F30) =====
         print("\n--- Preferred PLMNs ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F30)
-        if sw1 in [0x90, 0x9F, 0x91]:
-            data, sw1, sw2 = self.read_binary(30)  # Read first 10 PLMNs
+        result = gsm_efs[0x6F30]
+        if result:
+            data, sw1, sw2 = result
             if sw1 == 0x90:
                 plmns = self.decode_plmn(data)
                 if plmns:
@@ -783,11 +1041,9 @@ class SIMReader:
 
         # ===== FPLMN - Forbidden PLMNs (EF_FPLMN - 6F7B) =====
         print("\n--- Forbidden PLMNs ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F7B)
-        if sw1 in [0x90, 0x9F, 0x91]:
-            data, sw1, sw2 = self.read_binary(12)  # 4 forbidden PLMNs
+        result = gsm_efs[0x6F7B]
+        if result:
+            data, sw1, sw2 = result
             if sw1 == 0x90:
                 plmns = self.decode_plmn(data)
                 if plmns:
@@ -795,17 +1051,15 @@ class SIMReader:
                         print(f"  {plmn}")
                 else:
                     print("  None")
-                print(f"Raw: {toHexString(data)}")
+                print(f"Raw: {to_hex(data)}")
         else:
             print("Not available")
 
         # ===== LOCI - Location Information (EF_LOCI - 6F7E) =====
         print("\n--- Location Information ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F7E)
-        if sw1 in [0x90, 0x9F, 0x91]:
-            data, sw1, sw2 = self.read_binary(11)
+        result = gsm_efs[0x6F7E]
+        if result:
+            data, sw1, sw2 = result
             if sw1 == 0x90:
                 loci = self.decode_loci(data)
                 if loci:
@@ -814,33 +1068,29 @@ class SIMReader:
                     print(f"  MNC: {loci['mnc']}")
                     print(f"  LAC: {loci['lac']}")
                     print(f"  Status: {loci['update_status']}")
-                print(f"Raw: {toHexString(data)}")
+                print(f"Raw: {to_hex(data)}")
         else:
             print("Not available")
 
         # ===== ACC - Access Control Class (EF_ACC - 6F78) =====
         print("\n--- Access Control Class ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F78)
-        if sw1 in [0x90, 0x9F, 0x91]:
-            data, sw1, sw2 = self.read_binary(2)
+        result = gsm_efs[0x6F78]
+        if result:
+            data, sw1, sw2 = result
             if sw1 == 0x90:
                 acc = self.decode_acc(data)
                 if acc:
                     print(f"  Value: {acc['value']}")
                     print(f"  Classes: {', '.join(acc['classes']) if acc['classes'] else 'None'}")
-                print(f"Raw: {toHexString(data)}")
+                print(f"Raw: {to_hex(data)}")
         else:
             print("Not available")
 
         # ===== AD - Administrative Data (EF_AD - 6FAD) =====
         print("\n--- Administrative Data ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6FAD)
-        if sw1 in [0x90, 0x9F, 0x91]:
-            data, sw1, sw2 = self.read_binary(4)
+        result = gsm_efs[0x6FAD]
+        if result:
+            data, sw1, sw2 = result
             if sw1 == 0x90:
                 ad = self.decode_ad(data)
                 if ad:
@@ -848,287 +1098,86 @@ class SIMReader:
                     print(f"  OFM: {ad['ofm']}")
                     if 'mnc_length' in ad:
                         print(f"  MNC Length: {ad['mnc_length']} digits")
-                print(f"Raw: {toHexString(data)}")
+                print(f"Raw: {to_hex(data)}")
         else:
             print("Not available")
 
         # ===== HPLMN Search Period (EF_HPLMN - 6F31) =====
         print("\n--- HPLMN Search Period ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F31)
-        if sw1 in [0x90, 0x9F, 0x91]:
-            data, sw1, sw2 = self.read_binary(1)
+        result = gsm_efs[0x6F31]
+        if result:
+            data, sw1, sw2 = result
             if sw1 == 0x90 and data:
                 interval = data[0]
                 if interval == 0:
                     print(f"  Interval: Use default (60 min)")
                 else:
                     print(f"  Interval: {interval * 6} minutes")
-                print(f"Raw: {toHexString(data)}")
+                print(f"Raw: {to_hex(data)}")
         else:
             print("Not available")
 
         # ===== Phase (EF_Phase - 6FAE) =====
         print("\n--- SIM Phase ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6FAE)
-        if sw1 in [0x90, 0x9F, 0x91]:
-            data, sw1, sw2 = self.read_binary(1)
+        result = gsm_efs[0x6FAE]
+        if result:
+            data, sw1, sw2 = result
             if sw1 == 0x90 and data:
-                phase_map = {0: "Phase 1", 2: "Phase 2", 3: "Phase 2+"}
-                print(f"  Phase: {phase_map.get(data[0], f'Unknown ({data[0]})')}")
+                print(f"  Phase: {SIM_PHASE.get(data[0], f'Unknown ({data[0]})')}")
         else:
             print("Not available")
 
         # ===== ADN - Contacts (EF_ADN - 6F3A) =====
         print("\n--- Contacts (ADN) ---")
-        contacts_found = 0
-
-        # Try GSM first
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F3A)
-
-        use_usim = False
-        if sw1 not in [0x90, 0x9F, 0x91]:
-            # Try USIM
-            print("  (Trying USIM ADF...)")
-            if self.select_usim():
-                data, sw1, sw2 = self.select_file_usim(0x6F3A)
-                use_usim = True
-
-        if sw1 in [0x90, 0x9F, 0x91, 0x61]:
-            # Parse FCP template for USIM or use GSM response
-            record_len = 34  # default
-            num_records = 250
-
-            if use_usim and data:
-                # Parse FCP template (tag 62)
-                i = 0
-                while i < len(data) - 2:
-                    if data[i] == 0x82:  # File descriptor
-                        i += 1
-                        fd_len = data[i]
-                        i += 1
-                        if fd_len >= 3:
-                            record_len = (data[i+1] << 8) | data[i+2]
-                        if fd_len >= 5:
-                            num_records = data[i+3]
-                        break
-                    elif data[i] in [0x62, 0x80, 0x81, 0x83, 0x84, 0x8A, 0x8B, 0x8C, 0xA5, 0xAB, 0xC6]:
-                        i += 1
-                        i += data[i] + 1
-                    else:
-                        i += 1
-            elif data and len(data) > 14:
-                record_len = data[14]
-                num_records = ((data[2] << 8) | data[3]) // record_len if record_len > 0 else 10
-
-            print(f"  Record length: {record_len}, Max records: {num_records}")
-
-            for rec in range(1, min(num_records + 1, 251)):
-                if use_usim:
-                    data, sw1, sw2 = self.read_record_usim(rec, record_len)
-                else:
-                    data, sw1, sw2 = self.read_record(rec, record_len)
-
-                if sw1 == 0x90 and data:
-                    if all(b == 0xFF for b in data):
-                        continue
-
-                    alpha_len = record_len - 14
-                    alpha = self.decode_alpha_id(data[:alpha_len])
-                    number_data = data[alpha_len:]
-                    number = self.decode_bcd_number(number_data)
-
-                    if alpha or number:
-                        contacts_found += 1
-                        print(f"  [{rec}] {alpha or 'No name'}: {number or 'No number'}")
-
-                elif sw1 == 0x6A and sw2 == 0x83:
-                    # Record not found - end of file
-                    break
-
-        if contacts_found == 0:
+        found = self.dump_phonebook(0x6F3A, 250, 250, verbose=True)
+        if not found:
             print("  No contacts stored")
 
         # ===== FDN - Fixed Dialing Numbers (EF_FDN - 6F3B) =====
         print("\n--- Fixed Dialing Numbers (FDN) ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F3B)
-
-        use_usim_fdn = False
-        if sw1 not in [0x90, 0x9F, 0x91]:
-            if self.select_usim():
-                data, sw1, sw2 = self.select_file_usim(0x6F3B)
-                use_usim_fdn = True
-
-        if sw1 in [0x90, 0x9F, 0x91, 0x61]:
-            record_len = data[14] if len(data) > 14 else 34
-            num_records = ((data[2] << 8) | data[3]) // record_len if len(data) > 3 and record_len > 0 else 10
-
-            fdn_found = 0
-            for rec in range(1, min(num_records + 1, 51)):
-                if use_usim_fdn:
-                    data, sw1, sw2 = self.read_record_usim(rec, record_len)
-                else:
-                    data, sw1, sw2 = self.read_record(rec, record_len)
-                if sw1 == 0x90 and data:
-                    if all(b == 0xFF for b in data):
-                        continue
-
-                    alpha_len = record_len - 14
-                    alpha = self.decode_alpha_id(data[:alpha_len])
-                    number = self.decode_bcd_number(data[alpha_len:])
-
-                    if alpha or number:
-                        fdn_found += 1
-                        print(f"  [{rec}] {alpha or 'No name'}: {number or 'No number'}")
-                elif sw1 == 0x6A and sw2 == 0x83:
-                    break
-
-            if fdn_found == 0:
-                print("  No FDN entries")
-        else:
+        found = self.dump_phonebook(0x6F3B, 10, 50)
+        if found is None:
             print("Not available or PIN2 protected")
+        elif found == 0:
+            print("  No FDN entries")
 
         # ===== SDN - Service Dialing Numbers (EF_SDN - 6F49) =====
         print("\n--- Service Dialing Numbers (SDN) ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F49)
-
-        use_usim_sdn = False
-        if sw1 not in [0x90, 0x9F, 0x91]:
-            if self.select_usim():
-                data, sw1, sw2 = self.select_file_usim(0x6F49)
-                use_usim_sdn = True
-
-        if sw1 in [0x90, 0x9F, 0x91, 0x61]:
-            record_len = data[14] if len(data) > 14 else 34
-            num_records = ((data[2] << 8) | data[3]) // record_len if len(data) > 3 and record_len > 0 else 10
-
-            sdn_found = 0
-            for rec in range(1, min(num_records + 1, 51)):
-                if use_usim_sdn:
-                    data, sw1, sw2 = self.read_record_usim(rec, record_len)
-                else:
-                    data, sw1, sw2 = self.read_record(rec, record_len)
-                if sw1 == 0x90 and data:
-                    if all(b == 0xFF for b in data):
-                        continue
-
-                    alpha_len = record_len - 14
-                    alpha = self.decode_alpha_id(data[:alpha_len])
-                    number = self.decode_bcd_number(data[alpha_len:])
-
-                    if alpha or number:
-                        sdn_found += 1
-                        print(f"  [{rec}] {alpha or 'No name'}: {number or 'No number'}")
-                elif sw1 == 0x6A and sw2 == 0x83:
-                    break
-
-            if sdn_found == 0:
-                print("  No service numbers")
-        else:
+        found = self.dump_phonebook(0x6F49, 10, 50)
+        if found is None:
             print("Not available")
+        elif found == 0:
+            print("  No service numbers")
 
         # ===== LND - Last Numbers Dialed (EF_LND - 6F44) =====
         print("\n--- Last Numbers Dialed ---")
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F44)
-
-        use_usim_lnd = False
-        if sw1 not in [0x90, 0x9F, 0x91]:
-            if self.select_usim():
-                data, sw1, sw2 = self.select_file_usim(0x6F44)
-                use_usim_lnd = True
-
-        if sw1 in [0x90, 0x9F, 0x91, 0x61]:
-            record_len = data[14] if len(data) > 14 else 34
-            num_records = ((data[2] << 8) | data[3]) // record_len if len(data) > 3 and record_len > 0 else 5
-
-            lnd_found = 0
-            for rec in range(1, min(num_records + 1, 21)):
-                if use_usim_lnd:
-                    data, sw1, sw2 = self.read_record_usim(rec, record_len)
-                else:
-                    data, sw1, sw2 = self.read_record(rec, record_len)
-                if sw1 == 0x90 and data:
-                    if all(b == 0xFF for b in data):
-                        continue
-
-                    alpha_len = record_len - 14
-                    alpha = self.decode_alpha_id(data[:alpha_len])
-                    number = self.decode_bcd_number(data[alpha_len:])
-
-                    if number:
-                        lnd_found += 1
-                        print(f"  [{rec}] {alpha or 'Unknown'}: {number}")
-                elif sw1 == 0x6A and sw2 == 0x83:
-                    break
-
-            if lnd_found == 0:
-                print("  No recent calls")
-        else:
+        found = self.dump_phonebook(0x6F44, 5, 20, number_required=True, no_name="Unknown")
+        if found is None:
             print("Not available")
+        elif found == 0:
+            print("  No recent calls")
 
         # ===== SMS - Short Messages (EF_SMS - 6F3C) =====
         print("\n--- SMS Messages ---")
         sms_found = 0
 
-        # Try GSM first
-        self.select_file_gsm(0x3F00)
-        self.select_file_gsm(0x7F20)
-        data, sw1, sw2 = self.select_file_gsm(0x6F3C)
-
-        use_usim_sms = False
-        if sw1 not in [0x90, 0x9F, 0x91]:
-            # Try USIM
-            print("  (Trying USIM ADF...)")
-            if self.select_usim():
-                data, sw1, sw2 = self.select_file_usim(0x6F3C)
-                use_usim_sms = True
-
-        if sw1 in [0x90, 0x9F, 0x91, 0x61]:
-            record_len = 176  # SMS records are always 176 bytes
-            num_records = 50  # default
-
-            if data and len(data) > 3:
-                file_size = (data[2] << 8) | data[3]
-                num_records = file_size // record_len
+        sw1, use_usim_sms = self.select_record_ef(0x6F3C, verbose=True)
+        if sw1 in SW1_SELECT_OK_ANY:
+            # SMS records are always 176 bytes
+            record_len, num_records = self.record_layout(0x6F3C, 176, 50)
 
             print(f"  Max SMS slots: {num_records}")
 
-            for rec in range(1, min(num_records + 1, 51)):
-                if use_usim_sms:
-                    data, sw1, sw2 = self.read_record_usim(rec, record_len)
-                else:
-                    data, sw1, sw2 = self.read_record(rec, record_len)
-
-                if sw1 == 0x90 and data:
-                    sms = self.decode_sms(data)
-                    if sms:
-                        sms_found += 1
-                        print(f"\n  Message {rec}:")
-                        print(f"    Status: {sms.get('status', 'Unknown')}")
-                        if sms.get('sender'):
-                            print(f"    From: {sms['sender']}")
-                        if sms.get('recipient'):
-                            print(f"    To: {sms['recipient']}")
-                        if sms.get('timestamp'):
-                            print(f"    Date: {sms['timestamp']}")
-                        if sms.get('smsc'):
-                            print(f"    SMSC: {sms['smsc']}")
-                        if sms.get('message'):
-                            print(f"    Text: {sms['message']}")
-
-                elif sw1 == 0x6A and sw2 == 0x83:
-                    break
+            for rec, data in self.read_records(num_records, record_len, use_usim_sms, cap=50):
+                sms = self.decode_sms(data)
+                if sms:
+                    sms_found += 1
+                    lines = [f"\n  Message {rec}:",
+                             f"    Status: {sms.get('status', 'Unknown')}"]
+                    for key, label in SMS_FIELDS:
+                        if sms.get(key):
+                            lines.append(f"    {label}: {sms[key]}")
+                    print("\n".join(lines))
 
         if sms_found == 0:
             print("  No SMS messages stored")
@@ -1151,6 +1200,7 @@ OPTIONS:
     -o, --output FILE   Save output to custom filename
     -r, --reader NUM    Select reader by index (default: 0)
     -l, --list          List available readers and exit
+    -a, --aggressive    Read every record instead of stopping early
     -h, --help          Show this help message
 
 EXAMPLES:
@@ -1171,6 +1221,7 @@ TROUBLESHOOTING:
 def list_readers():
     """List available smart card readers"""
     try:
+        from smartcard.System import readers
         r = readers()
         if not r:
             print("No smart card readers found.")
@@ -1210,6 +1261,8 @@ Examples:
                         help='Select reader by index (default: 0)')
     parser.add_argument('-l', '--list', action='store_true',
                         help='List available readers and exit')
+    parser.add_argument('-a', '--aggressive', action='store_true',
+                        help='Read every record instead of stopping early')
 
     # Handle no arguments or invalid arguments gracefully
     try:
@@ -1226,21 +1279,23 @@ Examples:
 
     output_capture = None
 
-    sim = SIMReader(reader_index=args.reader)
+    sim = SIMReader(reader_index=args.reader, aggressive=args.aggressive)
     try:
         sim.connect()
 
-        # If saving, set up output capture after connection
-        if args.save or args.output:
-            # We'll determine filename after reading ICCID
-            output_capture = OutputCapture(filename=None)
-            sys.stdout = output_capture
-
-        sim.read_all()
+        # If saving, capture only the dump itself; plain runs print directly
+        with buffered_stdout(), sim.transaction():
+            if args.save or args.output:
+                # We'll determine filename after reading ICCID
+                output_capture = OutputCapture(filename=None)
+                with contextlib.redirect_stdout(output_capture):
+                    sim.read_all()
+            else:
+                sim.read_all()
 
         # Save output if requested
         if output_capture:
-            sys.stdout = output_capture.terminal  # Restore stdout
+            from datetime import datetime
 
             if args.output:
                 filename = args.output
@@ -1254,9 +1309,6 @@ Examples:
             output_capture.save()
 
     except Exception as e:
-        if output_capture:
-            sys.stdout = output_capture.terminal
-
         error_msg = str(e).lower()
 
         print(f"\nError: {e}\n")